@@ -5,7 +5,8 @@ and analyzing their responses for binary domain classification tasks.
 """
 
 import os
-import math
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
 
 # Models - Import different LLM implementations
 from models.Gemini.Gemini import Gemini
@@ -17,12 +18,15 @@ from models.MistralAI.MistralAI import MistralAI
 from utils.generatePrompt import PromptGenerator
 from utils.file_utils import save_to_text_file, load_from_text_file
 from utils.analyzer import Analyzer
+from utils.metrics import Metrics
+from utils.response_cache import ResponseCache
 
 # Execution configuration
 SECOND_TRY = False        # Flag to indicate if this is a second classification attempt
 EXPERIMENT = 2           # ID of the experiment to run (1 or 2)
 BATCH_SIZE = 125         # Batch size for processing domains
 SEND_REQUEST = False      # Flag to control whether to send requests to LLMs
+MAX_CONCURRENT_REQUESTS = 8  # Maximum number of batches sent at the same time to each LLM
 
 # List of available LLMs - Comment/uncomment to select models for testing
 LLMS = [
@@ -42,6 +46,7 @@ DATASET_DIR = "dataset/"                  # Directory for storing datasets
 SECOND_TRY_DOMAINS = "try_again_domains"  # Directory for domains needing reclassification
 METRICS_DIR = "metrics/"                  # Directory for storing metrics
 OUTPUT_DIR = "output"                     # Directory for results
+CACHE_FILE = ".llm_cache.sqlite"          # Database of previous LLM responses
 
 # Initialize core components
 GENERATOR = PromptGenerator(
@@ -50,6 +55,7 @@ GENERATOR = PromptGenerator(
     "prompts/legitimateDomains/domains.csv"
 )
 ANALYZER = Analyzer("prompts/datasetAGDFamilies","prompts/legitimateDomains/domains.csv")
+STOP_REQUESTS = threading.Event()  # Set on interrupt so that no new batch is sent
 
 def readPrompt(experiment: int) -> tuple:
     """
@@ -126,6 +132,166 @@ def readPrompt(experiment: int) -> tuple:
     return explanationPrompt, samplesPromptList
 
 
+def splitInChunks(samplesPromptList: list) -> list:
+    """
+    Splits the domains into batches of BATCH_SIZE and builds the prompt of each batch.
+
+    Parameters:
+    - samplesPromptList (list): The list of domains to classify.
+
+    Returns:
+    - list: A list of (chunk, samplesPrompt) tuples, where chunk is the list of domains
+      of the batch and samplesPrompt the prompt sent to the LLMs.
+    """
+    return [
+        (chunk, GENERATOR.create_prompt_from_domain_list(chunk))
+        for chunk in (samplesPromptList[i:i + BATCH_SIZE] for i in range(0, len(samplesPromptList), BATCH_SIZE))
+    ]
+
+
+def processChunks(llm, conversation_history: dict, chunks: list, output_file: str, response_cache: ResponseCache):
+    """
+    Sends the batches of domains to an LLM and saves the responses.
+
+    Up to MAX_CONCURRENT_REQUESTS batches are in flight at the same time, since each request
+    spends almost all of its time waiting on the network. Responses are appended to the
+    output file in batch order from the calling thread, through a single buffered handle.
+    Batches already answered in full in the output file are skipped.
+
+    If a batch fails, the batches not sent yet are cancelled, every response already received
+    is still saved, and a RuntimeError is raised at the end. Batches are not sent either once
+    STOP_REQUESTS is set. Batches left without a response are saved with an empty one, so that
+    check_domains leaves their domains to the try-again path.
+
+    Parameters:
+    - llm (LLM): The model to send the batches to.
+    - conversation_history (dict): The conversation crafted with the explanation prompt.
+    - chunks (list): The (chunk, samplesPrompt) batches built by splitInChunks.
+    - output_file (str): The path of the file where prompts and responses are appended.
+    - response_cache (ResponseCache): The cache of previous LLM responses.
+    """
+    i_max = len(chunks)
+
+    # Skip the batches with the same content as a previous complete submission
+    answered = ANALYZER.answered_batches(output_file)
+    pending = [index for index, (chunk, _) in enumerate(chunks) if tuple(chunk) not in answered]
+    if len(pending) < i_max:
+        print(f"[{llm.model}] Skipping {i_max - len(pending)}/{i_max} chunks already answered in {output_file}")
+
+    def sendChunk(index: int) -> str:
+        # Batches that have not started when the run is stopped are not sent
+        if STOP_REQUESTS.is_set():
+            return ""
+
+        chunk, samplesPrompt = chunks[index]
+
+        # Display progress
+        print(f"[{llm.model}] Processing chunk {index + 1}/{i_max} with {len(chunk)} domains")
+
+        # Reuse the response of an identical previous request, if any
+        key = ResponseCache.make_key(llm.model, conversation_history, samplesPrompt)
+        response = response_cache.get(key)
+        if response is None:
+            # Get LLM response
+            response, _ = llm.chat(samplesPrompt, conversation_history)
+            # Only complete responses are cached, so a batch with missing domains is really sent again
+            if ANALYZER.is_response_complete(chunk, response):
+                response_cache.set(key, response)
+        return response
+
+    failed = []
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS)
+    try:
+        futures = [executor.submit(sendChunk, index) for index in pending]
+        # Keep the output file open for the whole run instead of reopening it for every batch
+        with open(output_file, 'a', encoding='utf-8', buffering=1 << 20) as f:
+            # Results are collected in submission order, so the output file keeps the batch order
+            for index, future in zip(pending, futures):
+                try:
+                    response = future.result()
+                except CancelledError:
+                    response = ""
+                except Exception as e:
+                    print(f"[{llm.model}] Chunk {index + 1}/{i_max} failed: {e}")
+                    if not failed:
+                        # Don't send the remaining batches, the ones in flight are still saved
+                        executor.shutdown(wait=False, cancel_futures=True)
+                    failed.append(e)
+                    response = ""
+                samplesPrompt = chunks[index][1]
+                # Save results to output file
+                f.write(f"{samplesPrompt}\n{'-' * 15}\n{response}\n{'*' * 15}\n")
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} chunks failed for {llm.model}") from failed[0]
+
+
+def runLLM(llm, explanationPrompt: str, chunks: list, response_cache: ResponseCache):
+    """
+    Executes the classification requests of one LLM and saves its responses.
+
+    Parameters:
+    - llm (LLM): The model to execute.
+    - explanationPrompt (str): The explanation prompt.
+    - chunks (list): The (chunk, samplesPrompt) batches of the testing dataset.
+    - response_cache (ResponseCache): The cache of previous LLM responses.
+    """
+    model_name = llm.model
+    conversation_history = llm.craftConversationHistory(explanationPrompt, "yes")
+    output_file = os.path.join(OUTPUT_DIR, f"{model_name}_EXP{str(EXPERIMENT)}.out")
+
+    print("-"*15)
+    print("Executing model: " + model_name)
+    print("-"*15)
+
+    if SECOND_TRY:
+        # Handle reclassification of domains
+        try_again_path = os.path.join(SECOND_TRY_DOMAINS, f"{model_name}_EXP{str(EXPERIMENT)}.json")
+        all_classified = ANALYZER.check_domains(file_path=output_file, output_path=try_again_path)
+        
+        # Continue processing until all domains are classified or the run is stopped
+        while not all_classified and not STOP_REQUESTS.is_set():
+            samplesPromptList = load_from_text_file(try_again_path)
+            print(f"Total size of re-testing dataset for {model_name}: " + str(len(samplesPromptList)))
+            
+            # Process domains in batches
+            processChunks(llm, conversation_history, splitInChunks(samplesPromptList), output_file, response_cache)
+            
+            # Check if all domains are now classified
+            all_classified = ANALYZER.check_domains(file_path=output_file, output_path=try_again_path)
+            
+    else:  
+        # First-time processing of domains
+        print(f"Total size of testing dataset for {model_name}: " + str(sum(len(chunk) for chunk, _ in chunks)))
+        
+        # Process domains in batches
+        processChunks(llm, conversation_history, chunks, output_file, response_cache)
+
+
+def analyzeLLM(model_name: str):
+    """
+    Checks and analyzes the output file of one LLM.
+
+    Parameters:
+    - model_name (str): The name of the model whose output file is analyzed.
+
+    Returns:
+    - tuple: The (malicious_metrics, benign_metrics, overall_metrics) of the model, or None
+      if some domains didn't get classified.
+    """
+    # Define paths for analysis
+    file_path = os.path.join(OUTPUT_DIR, f"{model_name}_EXP{str(EXPERIMENT)}.out")
+    try_again_path = os.path.join(SECOND_TRY_DOMAINS, f"{model_name}_EXP{str(EXPERIMENT)}.json")
+
+    # Only analyze if all domains were correctly processed
+    if not ANALYZER.check_domains(file_path=file_path, output_path=try_again_path):
+        return None
+
+    # Handle binary classification analysis
+    return ANALYZER.analyze(file_path=file_path, size=100000)
+
 
 def main():
     """
@@ -148,117 +314,69 @@ def main():
     (explanationPrompt, samplesPromptList) = readPrompt(experiment=EXPERIMENT)
 
     if SEND_REQUEST:
-        # Process each configured LLM
-        for llm in LLMS:
-            model_name = llm.model
-            conversation_history = llm.craftConversationHistory(explanationPrompt, "yes")
-
-            print("-"*15)
-            print("Executing model: " + model_name)
-            print("-"*15)
-
-            if SECOND_TRY:
-                # Handle reclassification of domains
-                output_file = os.path.join(OUTPUT_DIR, f"{model_name}_EXP{str(EXPERIMENT)}.out")
-                try_again_path = os.path.join(SECOND_TRY_DOMAINS, f"{model_name}_EXP{str(EXPERIMENT)}.json")
-                all_classified = ANALYZER.check_domains(file_path=output_file, output_path=try_again_path)
-                
-                # Continue processing until all domains are classified
-                while not all_classified:
-                    samples_prompt_list_path = os.path.join(SECOND_TRY_DOMAINS, f"{LLMS[0].model}_EXP{str(EXPERIMENT)}.json")
-                    samplesPromptList = load_from_text_file(samples_prompt_list_path)
-                    print("Total size of re-testing dataset: " + str(len(samplesPromptList)))
-                    
-                    # Process domains in batches
-                    for i in range(0, len(samplesPromptList), BATCH_SIZE):
-                        chunk = samplesPromptList[i:i + BATCH_SIZE]
-                        samplesPrompt = GENERATOR.create_prompt_from_domain_list(chunk)
-
-                        # Calculate and display progress
-                        len_chunck = len(samplesPrompt.split(","))
-                        i_max = math.ceil(len(samplesPromptList) / BATCH_SIZE)
-                        print(f"Processing chunk {i // BATCH_SIZE + 1}/{i_max} with {len_chunck} domains")
-
-                        # Get LLM response and save results
-                        response, _ = llm.chat(samplesPrompt, conversation_history)
-                        with open(output_file, 'a', encoding='utf-8') as f:
-                            f.write(samplesPrompt + "\n")
-                            f.write("-" * 15 + "\n")
-                            f.write(response + "\n")
-                            f.write("*" * 15 + "\n")
-                        
-                        # Check if all domains are now classified
-                        all_classified = ANALYZER.check_domains(file_path=output_file, output_path=try_again_path)
-                    
-            else:  
-                # First-time processing of domains
-                print("Total size of testing dataset: " + str(len(samplesPromptList)))
-                
-                # Process domains in batches
-                for i in range(0, len(samplesPromptList), BATCH_SIZE):
-                    chunk = samplesPromptList[i:i + BATCH_SIZE]
-                    samplesPrompt = GENERATOR.create_prompt_from_domain_list(chunk)
-
-                    # Calculate and display progress
-                    len_chunck = len(samplesPrompt.split(","))
-                    i_max = math.ceil(len(samplesPromptList) / BATCH_SIZE)
-                    print(f"Processing chunk {i // BATCH_SIZE + 1}/{i_max} with {len_chunck} domains")
-
-                    # Get LLM response
-                    response, _ = llm.chat(samplesPrompt, conversation_history)
-
-                    # Save results to output file
-                    output_file = os.path.join(OUTPUT_DIR, f"{model_name}_EXP{str(EXPERIMENT)}.out")
-                    with open(output_file, 'a', encoding='utf-8') as f:
-                        f.write(samplesPrompt + "\n")
-                        f.write("-" * 15 + "\n")
-                        f.write(response + "\n")
-                        f.write("*" * 15 + "\n")
+        # Process all configured LLMs at the same time, each provider has its own rate limits
+        # The batch prompts are the same for every model, build them only once
+        chunks = splitInChunks(samplesPromptList)
+        # The response cache is only opened when requests are sent
+        response_cache = ResponseCache(CACHE_FILE)
+        executor = ThreadPoolExecutor(max_workers=len(LLMS))
+        try:
+            futures = [executor.submit(runLLM, llm, explanationPrompt, chunks, response_cache) for llm in LLMS]
+            for llm, future in zip(LLMS, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # A failing model doesn't stop the others, all of them are still analyzed
+                    print(f"[{llm.model}] Execution stopped: {e}")
+        except KeyboardInterrupt:
+            # Stop sending new batches, the requests in flight finish and their responses are saved
+            print("Interrupted, waiting for the requests in flight...")
+            STOP_REQUESTS.set()
+            raise
+        finally:
+            executor.shutdown(cancel_futures=True)
+            response_cache.close()
     
-    # Analyze results for each LLM
-    for llm in LLMS:
-        model_name = llm.model
+    # Analyze the results of all LLMs, the domain labels are loaded once and reused for every model
+    model_names = [llm.model for llm in LLMS]
+    results = [analyzeLLM(model_name) for model_name in model_names]
+
+    completed = []
+    for model_name, metrics in zip(model_names, results):
         print("-"*15)
         print("Stats model: " + model_name)
         print("-"*15)
-        
-        # Define paths for analysis
-        file_path = os.path.join(OUTPUT_DIR, f"{model_name}_EXP{str(EXPERIMENT)}.out")
-        try_again_path = os.path.join(SECOND_TRY_DOMAINS, f"{model_name}_EXP{str(EXPERIMENT)}.json")
 
-        # Only analyze if all domains were correctly processed
-        if ANALYZER.check_domains(file_path=file_path, output_path=try_again_path):
-            # Handle binary classification analysis
-            (malicious_metrics, benign_metrics, overall_metrics) = ANALYZER.analyze(file_path=file_path, size=100000)
-            
-            # Create metrics directory
-            os.makedirs(METRICS_DIR, exist_ok=True)
-            
-            # Save overall metrics
-            metrics_path = os.path.join(METRICS_DIR, f"GLOBAL_EXP{str(EXPERIMENT)}.csv")
-            file_exists = os.path.isfile(metrics_path)
-            with open(metrics_path, mode='a') as file:
-                if not file_exists:
-                    file.write("model,"+overall_metrics.csv_header() + '\n')
-                file.write(model_name+","+overall_metrics.to_csv() + '\n')
-            
-            # Save malicious domain metrics
-            metrics_path = os.path.join(METRICS_DIR, f"MALICIOUS_EXP{str(EXPERIMENT)}.csv")
-            file_exists = os.path.isfile(metrics_path)
-            with open(metrics_path, mode='a') as file:
-                if not file_exists:
-                    file.write("model,"+malicious_metrics.csv_header() + '\n')
-                file.write(model_name+","+malicious_metrics.to_csv() + '\n')
-            
-            # Save benign domain metrics
-            metrics_path = os.path.join(METRICS_DIR, f"BENIGN_EXP{str(EXPERIMENT)}.csv")
-            file_exists = os.path.isfile(metrics_path)
-            with open(metrics_path, mode='a') as file:
-                if not file_exists:
-                    file.write("model,"+benign_metrics.csv_header() + '\n')
-                file.write(model_name+","+benign_metrics.to_csv() + '\n')
+        # Only save metrics if all domains were correctly processed
+        if metrics is not None:
+            completed.append((model_name, metrics))
         else:
+            try_again_path = os.path.join(SECOND_TRY_DOMAINS, f"{model_name}_EXP{str(EXPERIMENT)}.json")
             print(f"Some domains didn't get classified, please review {try_again_path}")
 
+    # No model got all its domains classified, there is nothing to save
+    if not completed:
+        return
+
+    # Create metrics directory
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    global_path = os.path.join(METRICS_DIR, f"GLOBAL_EXP{str(EXPERIMENT)}.csv")
+    malicious_path = os.path.join(METRICS_DIR, f"MALICIOUS_EXP{str(EXPERIMENT)}.csv")
+    benign_path = os.path.join(METRICS_DIR, f"BENIGN_EXP{str(EXPERIMENT)}.csv")
+    new_files = {path for path in (global_path, malicious_path, benign_path) if not os.path.isfile(path)}
+
+    # Open each metrics file once and write the rows of all the models at once
+    with open(global_path, mode='a', newline='') as global_file, \
+            open(malicious_path, mode='a', newline='') as malicious_file, \
+            open(benign_path, mode='a', newline='') as benign_file:
+        files = {global_path: global_file, malicious_path: malicious_file, benign_path: benign_file}
+        for path in new_files:
+            files[path].write(f"model,{Metrics().csv_header()}\n")
+
+        # Metrics are (malicious, benign, overall)
+        completed_names = [model_name for model_name, _ in completed]
+        for path, index in ((global_path, 2), (malicious_path, 0), (benign_path, 1)):
+            files[path].write(Metrics.batch_to_csv([metrics[index] for _, metrics in completed], labels=completed_names))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,8 +1,9 @@
-import requests
+import orjson
 import os
 from time import sleep
 import time
 from utils.config import Config
+from utils.rate_limiter import RateLimiter
 from models.LLM import LLM
 
 class Anthropic(LLM):
@@ -16,14 +17,21 @@ class Anthropic(LLM):
         url (str): The endpoint URL for the Anthropic API
         headers (dict): HTTP headers for API requests
         model (str): The name of the Anthropic model to use
+        client (httpx.Client): Pooled HTTP/2 client shared by all the instances of the provider
+        rpm_limiter (RateLimiter): Requests per minute limiter
+        tpm_limiter (RateLimiter): Estimated tokens per minute limiter
+        log_path (str): File where the raw API responses are logged
+        time_log_path (str): File where the request durations are logged
     """
 
-    def __init__(self, model="claude-3-haiku-20240307",url="https://api.anthropic.com/v1/messages"):
+    def __init__(self, model="claude-3-haiku-20240307",url="https://api.anthropic.com/v1/messages", rpm=500, tpm=200000):
         """
         Initialize a new Anthropic chat instance.
         
         Args:
             model (str, optional): The model name to use. Defaults to "gpt-4o-mini"
+            rpm (int, optional): Maximum requests per minute sent to the API. Defaults to 500
+            tpm (int, optional): Maximum estimated tokens per minute sent to the API. Defaults to 200000
         """
         self.url = url
         config = Config()
@@ -34,6 +42,16 @@ class Anthropic(LLM):
             'x-api-key': api_key
         }
         self.model = model
+
+        # Reuse the pooled HTTP/2 connections of every instance of this provider
+        self.client = self.sharedClient(self.headers)
+
+        # Pace requests to stay inside the provider rate limits
+        self.rpm_limiter = RateLimiter(max_rate=rpm, time_period=60)
+        self.tpm_limiter = RateLimiter(max_rate=tpm, time_period=60)
+
+        # Prepare the log files once instead of on every request
+        self.openLogs(os.path.join(os.path.dirname(os.path.abspath(__file__)), "logger"))
     
     def chat(self, prompt: str, conversation_history: dict = None) -> tuple:
         """
@@ -57,12 +75,14 @@ class Anthropic(LLM):
         if conversation_history is None:
             conversation_history = {"messages": []}
         
-        # Create a copy of the existing messages and add the new prompt
-        messages = conversation_history["messages"].copy()
-        messages.append({
-            "role": "user",
-            "content": prompt
-        })
+        # Build a new message list so the shared conversation history is never modified
+        messages = [
+            *conversation_history["messages"],
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
         
         # Prepare the request data
         data = {
@@ -72,49 +92,45 @@ class Anthropic(LLM):
             "max_tokens": 4096,
         }
 
-        ok = False
-        while not ok:
-            # Send request to the API and get response
-            first = time.time()
-            response = requests.post(self.url, headers=self.headers, json=data)
-            second = time.time()
-            duration = second - first
-
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            target_dir = os.path.join(script_dir, "logger")
-            os.makedirs(target_dir, exist_ok=True)
+        # Serialize the request body once for all the attempts
+        body = orjson.dumps(data)
 
+        for attempt in range(self.MAX_RETRIES):
+            response = None
             try:
-                # Log
-                log_name = "responses_"+self.model+".log"
-                log_path = os.path.join(target_dir, log_name)
-                with open(log_path, "a") as f:
-                    f.write(str(response.json()))
-                    f.write("\n"+("-"*15)+"\n")
+                self.waitRateLimits(body)
+
+                # Send request to the API and get response
+                first = time.time()
+                response = self.client.post(self.url, content=body)
+                second = time.time()
+                duration = second - first
+
+                # Log the response as received
+                self.logResponse(response.text)
                 # Get answer to the prompt
-                response_content = response.json()['content'][0]['text']
+                parsed = orjson.loads(response.content)
+                response_content = parsed['content'][0]['text']
                 # Log time
-                log_name_time = "responses_time_"+self.model+".log"
-                log_path_time = os.path.join(target_dir, log_name_time)
-                with open(log_path_time, "a") as f:
-                    f.write(f"{duration:.6f}\n")
-                ok = True
+                self.logTime(duration)
+                break
             except Exception as e:
                 print(e)
-                print("Trying again in 15 seconds to send the request...")
-                sleep(15)
-    
-
+                delay = self.retryDelay(attempt, response)
+                print(f"Trying again in {delay:.1f} seconds to send the request...")
+                sleep(delay)
+        else:
+            raise RuntimeError(f"No valid response from {self.model} after {self.MAX_RETRIES} attempts")
 
-        # Add the assistant's response to the messages
-        messages.append({
-            "role": "assistant",
-            "content": response_content
-        })
-        
-        # Create updated conversation history
+        # Create updated conversation history with the assistant's response
         updated_conversation = {
-            "messages": messages
+            "messages": [
+                *messages,
+                {
+                    "role": "assistant",
+                    "content": response_content
+                }
+            ]
         }
         
         # Return both the response and the updated conversation history
@@ -133,9 +149,18 @@ class Anthropic(LLM):
                 {
                     "messages": [
                         {"role": "user", "content": "user message"},
-                        {"role": "assistant", "content": "assistant response"}
+                        {"role": "assistant", "content": [
+                            {"type": "text", "text": "assistant response",
+                             "cache_control": {"type": "ephemeral"}}
+                        ]}
                     ]
                 }
+
+            The cache breakpoint on the last message marks this prefix, identical for every
+            batch, as cacheable. Anthropic only caches prefixes of at least 1024 tokens
+            (2048 on Haiku), so with the current explanation prompts (about 330 tokens
+            for experiment 1 and 900 for experiment 2) it has no effect yet; it only
+            starts saving input tokens if the prompts grow past those sizes.
         """
         conversation = {
             "messages": [
@@ -145,7 +170,13 @@ class Anthropic(LLM):
                 },
                 {
                     "role": "assistant",
-                    "content": assistant_message
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": assistant_message,
+                            "cache_control": {"type": "ephemeral"}
+                        }
+                    ]
                 }
             ]
         }
@@ -1,8 +1,9 @@
-import requests
+import orjson
 import os
 from time import sleep
 import time
 from utils.config import Config
+from utils.rate_limiter import RateLimiter
 from models.LLM import LLM
 
 class Gemini(LLM):
@@ -16,14 +17,21 @@ class Gemini(LLM):
         url (str): The endpoint URL for the Gemini API
         headers (dict): HTTP headers for API requests
         model (str): The name of the Gemini model to use
+        client (httpx.Client): Pooled HTTP/2 client shared by all the instances of the provider
+        rpm_limiter (RateLimiter): Requests per minute limiter
+        tpm_limiter (RateLimiter): Estimated tokens per minute limiter
+        log_path (str): File where the raw API responses are logged
+        time_log_path (str): File where the request durations are logged
     """
 
-    def __init__(self, model="gemini-1.5-flash-8b",url="https://generativelanguage.googleapis.com/v1/models/"):
+    def __init__(self, model="gemini-1.5-flash-8b",url="https://generativelanguage.googleapis.com/v1/models/", rpm=500, tpm=200000):
         """
         Initialize a new Gemini chat instance.
         
         Args:
             model (str, optional): The model name to use. Defaults to "gpt-4o-mini"
+            rpm (int, optional): Maximum requests per minute sent to the API. Defaults to 500
+            tpm (int, optional): Maximum estimated tokens per minute sent to the API. Defaults to 200000
         """
         self.url = url + model + ":generateContent"
         config = Config()
@@ -33,6 +41,16 @@ class Gemini(LLM):
             'x-goog-api-key': api_key
         }
         self.model = model
+
+        # Reuse the pooled HTTP/2 connections of every instance of this provider
+        self.client = self.sharedClient(self.headers)
+
+        # Pace requests to stay inside the provider rate limits
+        self.rpm_limiter = RateLimiter(max_rate=rpm, time_period=60)
+        self.tpm_limiter = RateLimiter(max_rate=tpm, time_period=60)
+
+        # Prepare the log files once instead of on every request
+        self.openLogs(os.path.join(os.path.dirname(os.path.abspath(__file__)), "logger"))
     
     def chat(self, prompt: str, conversation_history: dict = None) -> tuple:
         """
@@ -56,12 +74,14 @@ class Gemini(LLM):
         if conversation_history is None:
             conversation_history = {"contents": []}
         
-        # Create a copy of the existing messages and add the new prompt
-        messages = conversation_history["contents"].copy()
-        messages.append({
-            "role": "user",
-            "parts": [{"text": prompt}]
-        })
+        # Build a new message list so the shared conversation history is never modified
+        messages = [
+            *conversation_history["contents"],
+            {
+                "role": "user",
+                "parts": [{"text": prompt}]
+            }
+        ]
         
         generationConfig = {
             "temperature": 0.0,
@@ -74,47 +94,45 @@ class Gemini(LLM):
             "generationConfig": generationConfig
         }
 
-        ok = False
-        while not ok:
-            # Send request to the API and get response
-            first = time.time()
-            response = requests.post(self.url, headers=self.headers, json=data)
-            second = time.time()
-            duration = second - first
-
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            target_dir = os.path.join(script_dir, "logger")
-            os.makedirs(target_dir, exist_ok=True)
+        # Serialize the request body once for all the attempts
+        body = orjson.dumps(data)
 
+        for attempt in range(self.MAX_RETRIES):
+            response = None
             try:
-                # Log
-                log_name = "responses_"+self.model+".log"
-                log_path = os.path.join(target_dir, log_name)
-                with open(log_path, "a") as f:
-                    f.write(str(response.json()))
-                    f.write("\n"+("-"*15)+"\n")
+                self.waitRateLimits(body)
+
+                # Send request to the API and get response
+                first = time.time()
+                response = self.client.post(self.url, content=body)
+                second = time.time()
+                duration = second - first
+
+                # Log the response as received
+                self.logResponse(response.text)
                 # Get answer to the prompt
-                response_content = response.json()['candidates'][0]['content']['parts'][0]['text']
+                parsed = orjson.loads(response.content)
+                response_content = parsed['candidates'][0]['content']['parts'][0]['text']
                 # Log time
-                log_name_time = "responses_time_"+self.model+".log"
-                log_path_time = os.path.join(target_dir, log_name_time)
-                with open(log_path_time, "a") as f:
-                    f.write(f"{duration:.6f}\n")
-                ok = True
+                self.logTime(duration)
+                break
             except Exception as e:
                 print(e)
-                print("Trying again in 15 seconds to send the request...")
-                sleep(15)
-        
-        # Add the model's response to the messages
-        messages.append({
-            "role": "model",
-            "content": response_content
-        })
-        
-        # Create updated conversation history
+                delay = self.retryDelay(attempt, response)
+                print(f"Trying again in {delay:.1f} seconds to send the request...")
+                sleep(delay)
+        else:
+            raise RuntimeError(f"No valid response from {self.model} after {self.MAX_RETRIES} attempts")
+
+        # Create updated conversation history with the model's response
         updated_conversation = {
-            "contents": messages
+            "contents": [
+                *messages,
+                {
+                    "role": "model",
+                    "parts": [{"text": response_content}]
+                }
+            ]
         }
         
         # Return both the response and the updated conversation history
@@ -1,6 +1,24 @@
+import os
+import queue
+import random
+import atexit
+import threading
 from abc import ABC, abstractmethod
+import httpx
 
 class LLM(ABC):
+
+    # Maximum number of attempts to get a valid response before giving up
+    MAX_RETRIES = 8
+    # Upper bound, in seconds, for the wait between two attempts
+    MAX_RETRY_DELAY = 60
+
+    # Maximum number of log records written to disk at once
+    LOG_BATCH_SIZE = 64
+
+    # HTTP clients shared by all the instances of each provider class
+    _clients = {}
+    _clients_lock = threading.Lock()
     
     @abstractmethod
     def chat(self, prompt: str, conversation_history: dict = None) -> tuple:
@@ -35,4 +53,154 @@ class LLM(ABC):
         Returns:
             dict: A dictionary containing messages array and metadata
         """
-        pass
\ No newline at end of file
+        pass
+
+    def retryDelay(self, attempt: int, response=None) -> float:
+        """
+        Computes how long to wait before sending a failed request again.
+
+        The delay requested by the server in the "Retry-After" header is honored when
+        present; otherwise an exponential backoff with jitter is used.
+
+        Args:
+            attempt (int): Number of the failed attempt, starting at 0
+            response (optional): The HTTP response of the failed attempt, if any
+
+        Returns:
+            float: The number of seconds to wait
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return min(self.MAX_RETRY_DELAY, 2 ** attempt) + random.random()
+
+    def waitRateLimits(self, body: bytes):
+        """
+        Blocks until a request with the given body fits in the rate limits.
+
+        Consumes one request from `self.rpm_limiter` and the estimated number of
+        tokens of the body, about four bytes per token, from `self.tpm_limiter`.
+
+        Args:
+            body (bytes): The serialized JSON body about to be sent to the API
+        """
+        self.rpm_limiter.acquire()
+        self.tpm_limiter.acquire(len(body) // 4)
+
+    def sharedClient(self, headers: dict) -> httpx.Client:
+        """
+        Returns the HTTP client shared by all the instances of this provider class.
+
+        Models of the same provider talk to the same host with the same API key, so
+        sharing one client lets their concurrent requests reuse a single connection
+        pool, multiplexed over HTTP/2, instead of opening one pool per model.
+
+        Args:
+            headers (dict): HTTP headers for API requests
+
+        Returns:
+            httpx.Client: The shared client, created on first use
+        """
+        with LLM._clients_lock:
+            client = LLM._clients.get(type(self))
+            if client is None or client.is_closed:
+                client = httpx.Client(
+                    headers=headers,
+                    timeout=120.0,
+                    transport=httpx.HTTPTransport(
+                        http2=True,
+                        retries=3,
+                        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+                    )
+                )
+                LLM._clients[type(self)] = client
+            return client
+
+    def openLogs(self, target_dir: str):
+        """
+        Prepares the log files of the model and starts the thread that writes them.
+
+        Log records are queued by `logResponse` and `logTime` and written in batches by a
+        background thread, so requests never wait on disk I/O. The thread is stopped and
+        the pending records flushed by `close`, which is also registered to run at exit.
+
+        Args:
+            target_dir (str): Directory where the log files are created
+        """
+        os.makedirs(target_dir, exist_ok=True)
+        self.log_path = os.path.join(target_dir, f"responses_{self.model}.log")
+        self.time_log_path = os.path.join(target_dir, f"responses_time_{self.model}.log")
+        self._log_queue = queue.Queue()
+        self._log_thread = threading.Thread(target=self._logWorker, daemon=True)
+        self._log_thread.start()
+        atexit.register(self.close)
+
+    def logResponse(self, text: str):
+        """
+        Queues a raw API response to be written to the responses log.
+
+        Args:
+            text (str): The response body as received
+        """
+        self._log_queue.put((False, text + "\n" + ("-"*15) + "\n"))
+
+    def logTime(self, duration: float):
+        """
+        Queues the duration of a request to be written to the time log.
+
+        Args:
+            duration (float): Duration of the request in seconds
+        """
+        self._log_queue.put((True, f"{duration:.6f}\n"))
+
+    def _logWorker(self):
+        """
+        Writes the queued log records until `close` sends the stop signal (None).
+        """
+        with open(self.log_path, "a") as log_file, open(self.time_log_path, "a") as time_file:
+            running = True
+            while running:
+                # Wait for a record, then take whatever else is already queued
+                batch = [self._log_queue.get()]
+                while len(batch) < self.LOG_BATCH_SIZE:
+                    try:
+                        batch.append(self._log_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    running = False
+                    batch = [record for record in batch if record is not None]
+
+                log_file.write("".join(text for is_time, text in batch if not is_time))
+                time_file.write("".join(text for is_time, text in batch if is_time))
+                log_file.flush()
+                time_file.flush()
+
+    def close(self):
+        """
+        Flushes and closes the log files of this instance.
+
+        The HTTP client is shared with the other instances of the provider, so it is
+        left open here and closed at exit by `closeClients`.
+        """
+        if self._log_thread.is_alive():
+            self._log_queue.put(None)
+            self._log_thread.join()
+
+    @staticmethod
+    def closeClients():
+        """
+        Closes the HTTP clients shared by the instances of every provider class.
+        """
+        with LLM._clients_lock:
+            for client in LLM._clients.values():
+                client.close()
+            LLM._clients.clear()
+
+
+# Registered before any instance, so it runs after their `close` at exit
+atexit.register(LLM.closeClients)
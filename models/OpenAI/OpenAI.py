@@ -1,8 +1,9 @@
-import requests
+import orjson
 import os
 import time
 from time import sleep
 from utils.config import Config
+from utils.rate_limiter import RateLimiter
 from models.LLM import LLM
 
 class OpenAI(LLM):
@@ -16,14 +17,21 @@ class OpenAI(LLM):
         url (str): The endpoint URL for the OpenAI API
         headers (dict): HTTP headers for API requests
         model (str): The name of the OpenAI model to use
+        client (httpx.Client): Pooled HTTP/2 client shared by all the instances of the provider
+        rpm_limiter (RateLimiter): Requests per minute limiter
+        tpm_limiter (RateLimiter): Estimated tokens per minute limiter
+        log_path (str): File where the raw API responses are logged
+        time_log_path (str): File where the request durations are logged
     """
 
-    def __init__(self, model="gpt-4o-mini",url="https://api.openai.com/v1/chat/completions"):
+    def __init__(self, model="gpt-4o-mini",url="https://api.openai.com/v1/chat/completions", rpm=500, tpm=200000):
         """
         Initialize a new OpenAI chat instance.
         
         Args:
             model (str, optional): The model name to use. Defaults to "gpt-4o-mini"
+            rpm (int, optional): Maximum requests per minute sent to the API. Defaults to 500
+            tpm (int, optional): Maximum estimated tokens per minute sent to the API. Defaults to 200000
         """
         self.url = url
         config = Config()
@@ -33,6 +41,16 @@ class OpenAI(LLM):
             'Authorization': 'Bearer '+ api_key
         }
         self.model = model
+
+        # Reuse the pooled HTTP/2 connections of every instance of this provider
+        self.client = self.sharedClient(self.headers)
+
+        # Pace requests to stay inside the provider rate limits
+        self.rpm_limiter = RateLimiter(max_rate=rpm, time_period=60)
+        self.tpm_limiter = RateLimiter(max_rate=tpm, time_period=60)
+
+        # Prepare the log files once instead of on every request
+        self.openLogs(os.path.join(os.path.dirname(os.path.abspath(__file__)), "logger"))
     
     def chat(self, prompt: str, conversation_history: dict = None) -> tuple:
         """
@@ -56,12 +74,14 @@ class OpenAI(LLM):
         if conversation_history is None:
             conversation_history = {"messages": []}
         
-        # Create a copy of the existing messages and add the new prompt
-        messages = conversation_history["messages"].copy()
-        messages.append({
-            "role": "user",
-            "content": prompt
-        })
+        # Build a new message list so the shared conversation history is never modified
+        messages = [
+            *conversation_history["messages"],
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
         
         # o1 models don't support temperature parameter
         if "o1" in self.model:
@@ -78,49 +98,45 @@ class OpenAI(LLM):
                 "stream": False
             }
 
-        ok = False
-        while not ok:
-            # Send request to the API and get response
-            first = time.time()
-            response = requests.post(self.url, headers=self.headers, json=data)
-            second = time.time()
-            duration = second - first
-
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            target_dir = os.path.join(script_dir, "logger")
-            os.makedirs(target_dir, exist_ok=True)            
+        # Serialize the request body once for all the attempts
+        body = orjson.dumps(data)
 
+        for attempt in range(self.MAX_RETRIES):
+            response = None
             try:
-                # Log
-                log_name = "responses_"+self.model+".log"
-                log_path = os.path.join(target_dir, log_name)
-                with open(log_path, "a") as f:
-                    f.write(str(response.json()))
-                    f.write("\n"+("-"*15)+"\n")
+                self.waitRateLimits(body)
+
+                # Send request to the API and get response
+                first = time.time()
+                response = self.client.post(self.url, content=body)
+                second = time.time()
+                duration = second - first
+
+                # Log the response as received
+                self.logResponse(response.text)
                 # Get answer to the prompt
-                response_content = response.json()['choices'][0]['message']['content']
+                parsed = orjson.loads(response.content)
+                response_content = parsed['choices'][0]['message']['content']
                 # Log time
-                log_name_time = "responses_time_"+self.model+".log"
-                log_path_time = os.path.join(target_dir, log_name_time)
-                with open(log_path_time, "a") as f:
-                    f.write(f"{duration:.6f}\n")
-                ok = True
+                self.logTime(duration)
+                break
             except Exception as e:
                 print(e)
-                print("Trying again in 15 seconds to send the request...")
-                sleep(15)
-
-
+                delay = self.retryDelay(attempt, response)
+                print(f"Trying again in {delay:.1f} seconds to send the request...")
+                sleep(delay)
+        else:
+            raise RuntimeError(f"No valid response from {self.model} after {self.MAX_RETRIES} attempts")
 
-        # Add the assistant's response to the messages
-        messages.append({
-            "role": "assistant",
-            "content": response_content
-        })
-        
-        # Create updated conversation history
+        # Create updated conversation history with the assistant's response
         updated_conversation = {
-            "messages": messages
+            "messages": [
+                *messages,
+                {
+                    "role": "assistant",
+                    "content": response_content
+                }
+            ]
         }
         
         # Return both the response and the updated conversation history
@@ -1,5 +1,7 @@
 import os
 import math
+from collections import Counter
+from pathlib import Path
 from utils.metrics import Metrics
 from utils.file_utils import save_to_text_file
 
@@ -15,6 +17,8 @@ class Analyzer:
         self.malicious_dir = malicious_dir
         self.benign_file = benign_file
         self.format_error_file = "format_error.txt"
+        # Label of every known domain, loaded on first use
+        self._labels = None
 
     def validate_domains(self, domains: list, classifications: list, output_file: str) -> bool:
         """
@@ -30,67 +34,144 @@ class Analyzer:
             bool: True if all domains have classification, False if some are missing.
         """
         # Extract the domain names from the classifications list into a set for fast lookups
-        classification_domains = {entry.split("|")[0] for entry in classifications}
+        classification_domains = {entry.partition("|")[0] for entry in classifications}
 
-        ret = True
-        data = []
+        # Domains without classification, duplicates are removed by the set difference
+        missing = set(domains) - classification_domains
+        ret = not missing
 
-        # Remove duplicates
-        unique_domains = list(set(domains))
-
-        for domain in unique_domains:
-            # Check if the domain is not in the set of classification domains
-            if domain not in classification_domains:
-                # Write the missing domain to the output file
-                data.append(domain)
-                ret = False
-        
         if not ret:
-            save_to_text_file(filepath=output_file, data=data)
+            save_to_text_file(filepath=output_file, data=sorted(missing))
         else:
-            if os.path.exists(output_file):
-                os.remove(output_file)
+            Path(output_file).unlink(missing_ok=True)
 
         return ret
 
-    def read_file(self, file_path: str) -> tuple:
+    def is_response_complete(self, domains: list, response: str) -> bool:
         """
-        Reads the content of a file and extracts the initial domains and classifications.
+        Checks whether an LLM response contains a classification for every domain of its batch.
 
         Args:
-            file_path (str): Absolute or relative path to the file to analyze.
+            domains (list): The domains sent to the LLM.
+            response (str): The LLM response, one "[DOMAIN]|[RESULT]|[CONFIDENCE]" entry per line.
 
         Returns:
-            tuple: A tuple containing two lists:
-                - List of initial domains between "***************" and "---------------".
-                - List of classifications after "---------------".
+            bool: True if every domain has a classification in the response, False otherwise.
+        """
+        return self.is_batch_complete(domains, response.splitlines())
+
+    def is_batch_complete(self, domains: list, classifications: list) -> bool:
+        """
+        Checks whether the classifications of a batch include every domain of the batch.
+
+        Args:
+            domains (list): The domains of the batch.
+            classifications (list): The "[DOMAIN]|[RESULT]|[CONFIDENCE]" entries returned for the batch.
+
+        Returns:
+            bool: True if every domain has a classification, False otherwise.
+        """
+        classification_domains = {entry.strip().partition("|")[0] for entry in classifications}
+        return classification_domains.issuperset(domains)
+
+    def read_blocks(self, file_path: str):
         """
+        Reads a result file one block at a time.
+
+        Each block holds the domains of a batch, a "---------------" separator and the
+        classifications returned for the batch, and ends with "***************".
+        Blocks without a separator are skipped.
+
+        Args:
+            file_path (str): Absolute or relative path to the file to read.
+
+        Yields:
+            tuple: The (domains, classifications) lists of each block.
+        """
+        # Domain lines of the current block, kept until its "---------------" is reached
+        block_lines = []
+        # Domains and classifications of the current block, None until its separator is reached
+        block_domains = None
+        block_classifications = None
+        # Empty lines seen inside the current classifications, None before the first entry
+        empty_lines = None
+
         try:
-            with open(file_path, 'r') as file:
-                content = file.read()
+            with open(file_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    line = line.strip()
+                    if line.startswith("***************"):
+                        if block_classifications is not None:
+                            yield block_domains, block_classifications
+                        # A new block starts
+                        block_lines = []
+                        block_domains = None
+                        block_classifications = None
+                    elif block_classifications is not None:
+                        if not line:
+                            if empty_lines is not None:
+                                empty_lines += 1
+                        else:
+                            # Keep the empty lines between classifications, drop the leading and trailing ones
+                            block_classifications.extend([""] * (empty_lines or 0))
+                            block_classifications.append(line)
+                            empty_lines = 0
+                    elif line.startswith("---------------"):
+                        # The block has a separator, so its initial domains are kept
+                        block_domains = [domain.strip() for domain in "\n".join(block_lines).strip().split(",")]
+                        block_classifications = []
+                        empty_lines = None
+                    else:
+                        block_lines.append(line)
+
+                # The last block may not be closed by "***************"
+                if block_classifications is not None:
+                    yield block_domains, block_classifications
         except FileNotFoundError:
             raise FileNotFoundError(f"The file '{file_path}' does not exist.")
         except Exception as e:
             raise Exception(f"Error reading the file '{file_path}': {e}")
 
-        blocks = content.split("***************")
+    def read_file(self, file_path: str) -> tuple:
+        """
+        Reads the content of a file and extracts the initial domains and classifications.
+
+        Args:
+            file_path (str): Absolute or relative path to the file to analyze.
+
+        Returns:
+            tuple: A tuple containing two lists:
+                - List of initial domains between "***************" and "---------------".
+                - List of classifications after "---------------".
+        """
         classifications = []
         domains = []
 
-        for block in blocks:
-            if "---------------" in block:
-                try:
-                    # Extract the part before "---------------" for initial domains
-                    before_separator = block.split("---------------", 1)[0]
-                    domains.extend(line.strip() for line in before_separator.strip().split(","))
-                    # Extract the part after "---------------" for classifications
-                    after_separator = block.split("---------------", 1)[1]
-                    classifications.extend(line.strip() for line in after_separator.strip().splitlines())
-                except IndexError:
-                    continue
+        for block_domains, block_classifications in self.read_blocks(file_path):
+            domains.extend(block_domains)
+            classifications.extend(block_classifications)
 
         return domains, classifications
 
+    def answered_batches(self, file_path: str) -> set:
+        """
+        Finds the batches of a result file whose classifications include every domain.
+
+        Args:
+            file_path (str): Absolute or relative path to the result file.
+
+        Returns:
+            set: The tuple of domains of every batch answered in full, empty if the file does not exist.
+        """
+        if not os.path.exists(file_path):
+            return set()
+
+        return {
+            tuple(domains)
+            for domains, classifications in self.read_blocks(file_path)
+            if self.is_batch_complete(domains, classifications)
+        }
+
     def compute_metrics(self, tp: int, fp: int, fn: int, tn: int) -> Metrics:
         """
         Computes performance metrics given the confusion matrix values.
@@ -104,30 +185,62 @@ class Analyzer:
         Returns:
             Metrics: An instance of the Metrics class containing calculated metrics.
         """
-        accuracy = (tp + tn) / (tp + fp + fn + tn) if (tp + fp + fn + tn) > 0 else 0
-        precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-        recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+        # Sums of the confusion matrix, each computed once
+        n = tp + fp + fn + tn
+        p = tp + fp
+        a = tp + fn
+        nn = tn + fp
+        np_ = tn + fn
+
+        precision = tp / p if p > 0 else 0
+        recall = tp / a if a > 0 else 0
         f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-        fpr = fp / (fp + tn) if (fp + tn) > 0 else 0
+        fpr = fp / nn if nn > 0 else 0
         tpr = recall
-        if math.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn)) != 0:
-            mcc = ((tp * tn) - (fp * fn)) / math.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn))
-        else:
-            mcc = 0
-        if (tn+fp+fn+tp) != 0:
-            p0 = (tn+tp)/(tn+fp+fn+tp)
-            pa = ((tn+tp)/(tn+fp+fn+tp))*((tn+fn)/(tn+fp+fn+tp))
-            pb = ((fn+tp)/(tn+fp+fn+tp))*((fp+tp)/(tn+fp+fn+tp))
+        # Multiply the square roots instead of taking the root of the whole product
+        mcc_den = math.sqrt(p) * math.sqrt(a) * math.sqrt(nn) * math.sqrt(np_)
+        mcc = ((tp * tn) - (fp * fn)) / mcc_den if mcc_den != 0 else 0
+        if n:
+            p0 = (tn + tp) / n
+            accuracy = p0
+            pa = p0 * (np_ / n)
+            pb = (a / n) * (p / n)
             pe = pa + pb
-            if pe != 1:
-                kappa = (p0-pe)/(1-pe)
-            else:
-                kappa = 0
+            kappa = (p0 - pe) / (1 - pe) if pe != 1 else 0
         else:
+            accuracy = 0
             kappa = 0
 
         return Metrics(accuracy, precision, recall, f1_score, fpr, tpr, mcc, kappa)
 
+    def load_labels(self) -> dict:
+        """
+        Loads the label of every known domain, reading the domain files only on the first call.
+
+        Returns:
+            dict: A dictionary mapping each domain to True if malicious or False if benign.
+        """
+        if self._labels is not None:
+            return self._labels
+
+        # Malicious domains are added last so they win if a domain is in both lists.
+        labels = {}
+
+        with open(self.benign_file, 'r') as f:
+            labels.update((line.strip(), False) for line in f)
+
+        # scandir() returns the entry types with the listing, no extra stat() per file
+        with os.scandir(self.malicious_dir) as entries:
+            malicious_files = [entry.path for entry in entries if entry.is_file()]
+
+        for file_path in malicious_files:
+            # Read each file in one call instead of line by line
+            with open(file_path, 'r') as f:
+                labels.update((line.strip(), True) for line in f.read().splitlines())
+
+        self._labels = labels
+        return labels
+
     def analyze_classifier(self, result_list: list) -> tuple:
         """
         Analyzes the classifier and computes metrics for malicious, benign, and overall domains.
@@ -138,46 +251,43 @@ class Analyzer:
         Returns:
             tuple: A tuple of three Metrics instances (malicious_metrics, benign_metrics, overall_metrics).
         """
-        malicious_domains = set()
-        benign_domains = set()
-        analyzed_domains = set()
+        labels = self.load_labels()
 
-        for file in os.listdir(self.malicious_dir):
-            with open(os.path.join(self.malicious_dir, file), 'r') as f:
-                malicious_domains.update(line.strip() for line in f)
+        # Well-formed results as (domain, classification) pairs
+        parsed = []
+        # Incorrect lines, written to the error file once at the end
+        format_errors = []
 
-        with open(self.benign_file, 'r') as f:
-            benign_domains.update(line.strip() for line in f)
-
-        # Initialize confusion matrix values
-        tp, fn, tn, fp = 0, 0, 0, 0
-
-        # Process each result in the result list
+        # Parse each result in the result list
         for result in result_list:
-            try:
-                domain, classification, _ = result.split('|')
-            except ValueError:
-                # Write the incorrect line to the error file
-                with open(self.format_error_file, 'a') as error_file:
-                    error_file.write(f"{result}\n")
+            parts = result.split('|', 2)
+            # Lines must have exactly three fields, so the confidence cannot hold another "|"
+            if len(parts) != 3 or '|' in parts[2]:
+                format_errors.append(f"{result}\n")
                 continue
-            if domain in analyzed_domains:
-                continue
-            if domain in malicious_domains:
-                if classification == 'Y':  # Correctly classified as malicious
-                    tp += 1
-                else:  # Incorrectly classified as benign
-                    fn += 1
-                analyzed_domains.add(domain)
-            elif domain in benign_domains:
-                if classification == 'N':  # Correctly classified as benign
-                    tn += 1
-                else:  # Incorrectly classified as malicious
-                    fp += 1
-                analyzed_domains.add(domain)
-            else:
-                # Domains that are neither in malicious nor benign lists are ignored
+            parsed.append((parts[0], parts[1]))
+
+        # Write the incorrect lines to the error file
+        if format_errors:
+            with open(self.format_error_file, 'a') as error_file:
+                error_file.writelines(format_errors)
+
+        # Keep the first classification of each domain, the reversed pairs let it overwrite the later ones
+        classified = dict(reversed(parsed))
+
+        # Count the results by (is_malicious, is_correct), one label lookup per domain
+        counts = Counter()
+        expected = {True: 'Y', False: 'N'}
+        for domain, classification in classified.items():
+            is_malicious = labels.get(domain)
+            # Domains that are neither in malicious nor benign lists are ignored
+            if is_malicious is None:
                 continue
+            counts[is_malicious, classification == expected[is_malicious]] += 1
+
+        # Initialize confusion matrix values
+        tp, fn = counts[True, True], counts[True, False]
+        tn, fp = counts[False, True], counts[False, False]
 
         # Compute metrics for malicious, benign, and overall domains
         malicious_metrics = self.compute_metrics(tp, 0, fn, 0)
@@ -1,7 +1,13 @@
 import os
+import re
 from typing import Dict
 from pathlib import Path
 
+# A `KEY=VALUE` entry, lines starting with "#" are comments
+_ENTRY_RE = re.compile(r"^[^\S\n]*([^#=\s][^=\n]*)?=(.*)$", re.M)
+# A line that is neither empty, a comment nor an entry
+_INVALID_RE = re.compile(r"^[^\S\n]*([^#=\s][^=\n]*)$", re.M)
+
 class Config:
     """
     A class to read and parse configuration settings from a file.
@@ -36,21 +42,17 @@ class Config:
         if not self.file_path.exists():
             raise FileNotFoundError(f"The configuration file '{self.file_path}' does not exist.")
 
-        with self.file_path.open("r", encoding="utf-8") as file:
-            for line in file:
-                # Ignore empty lines or lines starting with a comment
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-                
-                # Split the line into a key-value pair
-                if "=" not in line:
-                    raise ValueError(f"Invalid line format in configuration file: {line}")
-                
-                key, value = line.split("=", 1)
-                # Remove any surrounding quotes from the value
-                value = value.strip().strip('"').strip("'")
-                self.config[key.strip()] = value.strip()
+        text = self.file_path.read_text(encoding="utf-8")
+
+        invalid = _INVALID_RE.search(text)
+        if invalid:
+            raise ValueError(f"Invalid line format in configuration file: {invalid.group(1).strip()}")
+
+        for match in _ENTRY_RE.finditer(text):
+            key, value = match.groups()
+            # Remove any surrounding quotes from the value
+            value = value.strip().strip('"').strip("'")
+            self.config[(key or "").strip()] = value.strip()
 
     def get_value(self, key: str) -> str:
         """
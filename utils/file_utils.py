@@ -1,5 +1,5 @@
 import os
-import json
+import orjson
 
 def save_to_text_file(filepath, data):
     """
@@ -9,8 +9,8 @@ def save_to_text_file(filepath, data):
         filepath: Path to the file where data will be saved.
         data: Data to save.
     """
-    with open(filepath, 'w', encoding='utf-8') as file:
-        json.dump(data, file, indent=4, ensure_ascii=False)
+    with open(filepath, 'wb') as file:
+        file.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
 def load_from_text_file(filepath):
     """
@@ -23,6 +23,6 @@ def load_from_text_file(filepath):
         The loaded data or None if the file does not exist.
     """
     if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        with open(filepath, 'rb') as file:
+            return orjson.loads(file.read())
     return None
\ No newline at end of file
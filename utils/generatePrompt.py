@@ -1,7 +1,23 @@
 import os
-from typing import List, Set, Tuple
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
 from pathlib import Path
 import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+
+@lru_cache(maxsize=None)
+def _read(path_str: str) -> str:
+    """
+    Read a prompt file once and keep its stripped content for the following calls.
+
+    Args:
+        path_str (str): Path to the prompt file
+
+    Returns:
+        str: The content of the prompt file
+    """
+    return Path(path_str).read_text(encoding='utf-8').strip()
 
 class PromptGenerator:
     """
@@ -27,7 +43,11 @@ class PromptGenerator:
         }
         self.validate_directory_structure()
         self.used_domains: Set[str] = set()
+        self._family_cache: Optional[Dict[str, Tuple[str, ...]]] = None
+        self._family_mtime: Optional[Tuple[float, ...]] = None
+        self._family_sets: Dict[str, FrozenSet[str]] = {}
         self.legitimate_domains: List[str] = self.load_legitimate_domains()
+        self._legitimate_set: FrozenSet[str] = frozenset(self.legitimate_domains)
 
     def validate_directory_structure(self):
         """
@@ -51,24 +71,83 @@ class PromptGenerator:
         Returns:
             List[str]: List of legitimate domains
         """
-        with open(self.legitimate_domains_file, 'r', encoding='utf-8') as f:
-            return [line.strip() for line in f if line.strip()]
+        # Read the file in one call and strip each line only once
+        lines = self.legitimate_domains_file.read_text(encoding='utf-8').splitlines()
+        return [domain for domain in map(str.strip, lines) if domain]
 
-    def read_family_domains(self):
+    @staticmethod
+    def read_family_file(file_path: Path) -> Tuple[str, Tuple[str, ...]]:
+        """
+        Read the domains of a single family file.
+
+        Args:
+            file_path (Path): Path to the family CSV file
+
+        Returns:
+            Tuple[str, Tuple[str, ...]]: The family name and its domains
+        """
+        # Read the file in one call instead of line by line
+        lines = file_path.read_text(encoding='utf-8').splitlines()
+        return file_path.stem, tuple(domain for domain in map(str.strip, lines) if domain)
+
+    def read_family_domains(self) -> Dict[str, Tuple[str, ...]]:
         """
         Read all domain family files and return their contents.
 
+        The result is cached and only read again from disk when the families
+        directory or any of its files has been modified since the last call.
+
         Returns:
-            dict: Dictionary mapping family names to lists of domains
-        """
-        families = {}
-        for file_path in self.families_dir.glob("*.csv"):
-            family_name = file_path.stem
-            with open(file_path, 'r', encoding='utf-8') as f:
-                domains = [line.strip() for line in f if line.strip()]
-            families[family_name] = domains
+            dict: Dictionary mapping family names to tuples of domains
+        """
+        file_paths = list(self.families_dir.glob("*.csv"))
+        mtime = (self.families_dir.stat().st_mtime, *(f.stat().st_mtime for f in file_paths))
+        if self._family_cache is not None and mtime == self._family_mtime:
+            return self._family_cache
+
+        # Read the family files concurrently to overlap their open and read latency
+        with ThreadPoolExecutor() as executor:
+            families = dict(executor.map(self.read_family_file, file_paths))
+
+        self._family_cache = families
+        self._family_mtime = mtime
+        self._family_sets = {name: frozenset(domains) for name, domains in families.items()}
         return families
 
+    def sample_available_domains(self, domains: Sequence[str], domain_set: FrozenSet[str], count: int,
+                                 allow_fewer: bool = False) -> List[str]:
+        """
+        Randomly select domains that have not been used yet and mark them as used.
+
+        The used domains of the list are found with a single set intersection. Instead of
+        filtering the whole list, enough extra domains are sampled to make up for the used
+        ones that may come out, and those are dropped from the sample. If the list repeats
+        a used domain the sample can come out short, and the filtered list is used instead.
+
+        Args:
+            domains (Sequence[str]): Domains to select from
+            domain_set (FrozenSet[str]): The same domains as a set
+            count (int): Number of domains to select
+            allow_fewer (bool, optional): Select every unused domain if there are fewer than
+                `count`, instead of raising ValueError. Defaults to False
+
+        Returns:
+            List[str]: The selected domains
+        """
+        used = self.used_domains.intersection(domain_set)
+        if not used:
+            selected = random.sample(domains, min(count, len(domains)) if allow_fewer else count)
+        else:
+            # Each used domain takes at least one place in the list, so there can't be more unused ones
+            sample_size = min(count, len(domains) - len(used)) if allow_fewer else count
+            selected = [d for d in random.sample(domains, sample_size + len(used)) if d not in used][:sample_size]
+            if len(selected) < sample_size:
+                # Repeated used domains took more places than expected, sample from the filtered list
+                available = [d for d in domains if d not in used]
+                selected = random.sample(available, min(count, len(available)) if allow_fewer else count)
+        self.used_domains.update(selected)
+        return selected
+
     def generate_test_domains(self, num_test_domains_per_family: int, num_legitimate_domains: int) -> List[str]:
         """
         Generate test domains by interleaving domains from families and legitimate domains.
@@ -84,15 +163,12 @@ class PromptGenerator:
         family_domains = []
 
         # Select test domains from each family
-        for domains in families.values():
-            available_domains = [d for d in domains if d not in self.used_domains]
-            selected = random.sample(available_domains, num_test_domains_per_family)
+        for family_name, domains in families.items():
+            selected = self.sample_available_domains(domains, self._family_sets[family_name], num_test_domains_per_family)
             family_domains.append(selected)
-            self.used_domains.update(selected)
 
         # Select legitimate domains
-        available_legitimate_domains = [d for d in self.legitimate_domains if d not in self.used_domains]
-        selected_legitimate = random.sample(available_legitimate_domains, num_legitimate_domains)
+        selected_legitimate = self.sample_available_domains(self.legitimate_domains, self._legitimate_set, num_legitimate_domains)
 
         # Calculate legitimate domains per iteration
         total_iterations = num_test_domains_per_family
@@ -100,22 +176,15 @@ class PromptGenerator:
         leftover_legitimate = num_legitimate_domains % total_iterations
 
         interleaved_domains = []
+        legitimate = iter(selected_legitimate)
 
         # Interleave family domains and legitimate domains
         for i in range(total_iterations):
             # Add one domain from each family
-            for family_list in family_domains:
-                interleaved_domains.append(family_list[i])
-
-            # Add legitimate domains for this iteration
-            for _ in range(legitimate_per_iteration):
-                if selected_legitimate:
-                    interleaved_domains.append(selected_legitimate.pop(0))
+            interleaved_domains.extend(family_list[i] for family_list in family_domains)
 
-            # Distribute leftover legitimate domains
-            if leftover_legitimate > 0 and selected_legitimate:
-                interleaved_domains.append(selected_legitimate.pop(0))
-                leftover_legitimate -= 1
+            # Add legitimate domains for this iteration, plus one of the leftovers in the first iterations
+            interleaved_domains.extend(islice(legitimate, legitimate_per_iteration + (i < leftover_legitimate)))
 
         return interleaved_domains
 
@@ -134,11 +203,10 @@ class PromptGenerator:
             FileNotFoundError: If the specified file doesn't exist
         """
         file_path = self.sections[section] / filename
-        if not file_path.exists():
+        try:
+            return _read(str(file_path))
+        except FileNotFoundError:
             raise FileNotFoundError(f"File {filename} not found")
-        
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read().strip()
 
     def create_prompt_from_domain_list(self, domains: List[str]) -> str:
         """
@@ -167,9 +235,7 @@ class PromptGenerator:
         family_samples = []
         
         for family_name, domains in families.items():
-            available_domains = [d for d in domains if d not in self.used_domains]
-            selected_domains = random.sample(available_domains, min(num_train_samples, len(available_domains)))
-            self.used_domains.update(selected_domains)
+            selected_domains = self.sample_available_domains(domains, self._family_sets[family_name], num_train_samples, allow_fewer=True)
             family_samples.append(f"{family_name}: {', '.join(selected_domains)};")
         
         return '\n'.join(family_samples)
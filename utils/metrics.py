@@ -1,4 +1,9 @@
 class Metrics:
+    # Fixed attributes, no per-instance __dict__
+    __slots__ = ('accuracy', 'precision', 'recall', 'f1_score', 'fpr', 'tpr', 'mcc', 'kappa')
+    # printf-style format of one CSV row
+    CSV_ROW_FORMAT = "%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f"
+
     def __init__(self, accuracy=0.0, precision=0.0, recall=0.0, f1_score=0.0, fpr=0.0, tpr=0.0, mcc=0.0, kappa=0.0):
         """
         Encapsulates performance metrics for a classification task.
@@ -60,4 +65,34 @@ class Metrics:
         Returns:
             str: A comma-separated string of the metric values.
         """
-        return f"{self.accuracy:.3f},{self.precision:.3f},{self.recall:.3f},{self.f1_score:.3f},{self.fpr:.3f},{self.tpr:.3f},{self.mcc:.3f},{self.kappa:.3f}"
\ No newline at end of file
+        return self.CSV_ROW_FORMAT % self.values()
+
+    def values(self):
+        """
+        Returns the metric values in CSV column order.
+
+        Returns:
+            tuple: The eight metric values.
+        """
+        return (self.accuracy, self.precision, self.recall, self.f1_score,
+                self.fpr, self.tpr, self.mcc, self.kappa)
+
+    @classmethod
+    def batch_to_csv(cls, metrics_list, labels=None):
+        """
+        Converts several Metrics objects to CSV rows with a single format operation.
+
+        Args:
+            metrics_list (list): Metrics objects to convert.
+            labels (list, optional): A value written as the first column of each row, such as the model name.
+
+        Returns:
+            str: One comma-separated row of metric values per object, each ending with a newline.
+        """
+        if labels is None:
+            row_format = cls.CSV_ROW_FORMAT + "\n"
+            values = tuple(value for metrics in metrics_list for value in metrics.values())
+        else:
+            row_format = "%s," + cls.CSV_ROW_FORMAT + "\n"
+            values = tuple(value for label, metrics in zip(labels, metrics_list) for value in (label, *metrics.values()))
+        return (row_format * len(metrics_list)) % values
\ No newline at end of file
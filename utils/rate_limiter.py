@@ -0,0 +1,52 @@
+import time
+import threading
+
+class RateLimiter:
+    """
+    A thread-safe token bucket used to pace requests below a provider rate limit.
+
+    The bucket holds up to `max_rate` tokens and refills continuously at
+    `max_rate` tokens every `time_period` seconds, so bursts are allowed up to
+    the bucket size and the sustained rate never exceeds the limit.
+
+    Attributes:
+        max_rate (float): Number of tokens allowed per time period
+        time_period (float): Length of the time period in seconds
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60):
+        """
+        Initialize a new RateLimiter instance with a full bucket.
+
+        Args:
+            max_rate (float): Number of tokens allowed per time period
+            time_period (float): Length of the time period in seconds (default is 60).
+        """
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = float(max_rate)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1):
+        """
+        Block until `amount` tokens are available and consume them.
+
+        Requests larger than the bucket are capped to its size so they can
+        still go through once the bucket is full.
+
+        Args:
+            amount (float): Number of tokens to consume (default is 1).
+        """
+        amount = min(amount, self.max_rate)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                refill = (now - self._last_refill) * self.max_rate / self.time_period
+                self._tokens = min(self.max_rate, self._tokens + refill)
+                self._last_refill = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) * self.time_period / self.max_rate
+            time.sleep(wait)
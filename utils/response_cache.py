@@ -0,0 +1,88 @@
+import zlib
+import orjson
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+class ResponseCache:
+    """
+    A persistent exact-match cache of LLM responses backed by SQLite.
+
+    Responses are keyed on a SHA-256 hash of the model name, the conversation
+    history and the prompt, and stored zlib-compressed. The cache can be shared
+    between threads.
+
+    Attributes:
+        file_path (str): Path to the SQLite database file
+    """
+
+    def __init__(self, file_path: str = ".llm_cache.sqlite"):
+        """
+        Initialize the ResponseCache instance, creating the database if needed.
+
+        Args:
+            file_path (str): Path to the SQLite database file (default is ".llm_cache.sqlite").
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response BLOB NOT NULL)"
+            )
+
+    @staticmethod
+    def make_key(model: str, conversation_history: dict, prompt: str) -> str:
+        """
+        Build the cache key of a request.
+
+        Args:
+            model (str): The name of the model
+            conversation_history (dict): The conversation sent before the prompt
+            prompt (str): The prompt sent to the model
+
+        Returns:
+            str: The hexadecimal SHA-256 digest identifying the request
+        """
+        payload = orjson.dumps([model, conversation_history, prompt], option=orjson.OPT_SORT_KEYS)
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Retrieve a cached response.
+
+        Args:
+            key (str): The cache key built with `make_key`
+
+        Returns:
+            Optional[str]: The cached response, or None if the key is not cached
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def set(self, key: str, response: str):
+        """
+        Store a response in the cache, replacing any previous one with the same key.
+
+        Args:
+            key (str): The cache key built with `make_key`
+            response (str): The response to store
+        """
+        blob = zlib.compress(response.encode("utf-8"))
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response) VALUES (?, ?)", (key, blob)
+            )
+
+    def close(self):
+        """
+        Close the underlying database connection.
+        """
+        with self._lock:
+            self._connection.close()